@@ -27,6 +27,31 @@ from neural_compressor.torch.utils import logger
 
 from .utility import quant_tensor
 
+try:
+    import numba
+
+    @numba.njit(parallel=True)
+    def _pack_rows_numba(raw, packed, n_pack, bits, mask):
+        for i in numba.prange(packed.shape[0]):
+            for j in range(packed.shape[1]):
+                start = j * n_pack
+                end = min(start + n_pack, raw.shape[1])
+                word = packed[i, j]
+                for e in range(start, end):
+                    word |= (raw[i, e] & mask) << (bits * (e - start))
+                packed[i, j] = word
+
+    def _pack_with_numba(raw_tensor, packed_tensor, n_pack, bits):
+        """Pack the raw int tensor into `packed_tensor` in one parallel pass.
+
+        Both tensors must live on CPU; `packed_tensor` is filled in place.
+        """
+        raw = raw_tensor.contiguous().to(packed_tensor.dtype).numpy()
+        _pack_rows_numba(raw, packed_tensor.numpy(), n_pack, bits, (1 << bits) - 1)
+
+except ImportError:  # pragma: no cover
+    _pack_with_numba = None
+
 
 class QDQLayer(torch.nn.Module):
     def __init__(self, module, input_scale=None) -> None:
@@ -205,14 +230,17 @@ class WeightOnlyLinear(torch.nn.Module):
         mask = torch.tensor(2**self.bits - 1, dtype=self.compression_dtype).to(self.device)
 
         # pack weight
-        for j in range(target_shape[1]):
-            start = self.n_pack * j
-            end = self.n_pack * (j + 1)
-            tmp = int_weight[:, start:end].type(self.compression_dtype)
-            for e in range(tmp.shape[1]):
-                tmp[:, e] &= mask
-                tmp[:, e] = tmp[:, e] << (self.bits * e)
-                self.qweight[:, j] |= tmp[:, e]
+        if _pack_with_numba is not None and self.qweight.device.type == "cpu":
+            _pack_with_numba(int_weight, self.qweight, self.n_pack, self.bits)
+        else:
+            for j in range(target_shape[1]):
+                start = self.n_pack * j
+                end = self.n_pack * (j + 1)
+                tmp = int_weight[:, start:end].type(self.compression_dtype)
+                for e in range(tmp.shape[1]):
+                    tmp[:, e] &= mask
+                    tmp[:, e] = tmp[:, e] << (self.bits * e)
+                    self.qweight[:, j] |= tmp[:, e]
         if not self.use_optimum_format and self.compression_dim == 0:
             self.qweight = self.qweight.t_().contiguous()
 
@@ -225,14 +253,17 @@ class WeightOnlyLinear(torch.nn.Module):
                 self.qzeros = self.qzeros.t_().contiguous()
             assert hasattr(self, "qzeros"), "zp is not set when initializing."
             target_shape = self.qzeros.shape
-            for j in range(target_shape[1]):
-                start = self.n_pack * j
-                end = self.n_pack * (j + 1)
-                tmp = zp[:, start:end].type(self.compression_dtype)
-                for e in range(tmp.shape[1]):
-                    tmp[:, e] &= mask
-                    tmp[:, e] = tmp[:, e] << (self.bits * e)
-                    self.qzeros[:, j] |= tmp[:, e]
+            if _pack_with_numba is not None and self.qzeros.device.type == "cpu":
+                _pack_with_numba(zp, self.qzeros, self.n_pack, self.bits)
+            else:
+                for j in range(target_shape[1]):
+                    start = self.n_pack * j
+                    end = self.n_pack * (j + 1)
+                    tmp = zp[:, start:end].type(self.compression_dtype)
+                    for e in range(tmp.shape[1]):
+                        tmp[:, e] &= mask
+                        tmp[:, e] = tmp[:, e] << (self.bits * e)
+                        self.qzeros[:, j] |= tmp[:, e]
             if self.use_optimum_format or self.compression_dim == 0:
                 self.qzeros = self.qzeros.t_().contiguous()
         if self.use_optimum_format:
@@ -26,11 +26,29 @@ import torch
 from neural_compressor.torch.algorithms import Quantizer
 from neural_compressor.torch.utils import get_device, is_transformers_imported, logger, set_module
 
-from .utility import cast_fp8, quant_tensor, search_clip
+from .utility import _compile_weight_config, _select_quant_tensor_impl, cast_fp8, quant_tensor, search_clip
 
 if is_transformers_imported():
     import transformers
 
+# Transient budget (in elements) for one batched `quant_tensor` call; buckets
+# holding more weight than this are consumed in slices so the torch.cat copy
+# stays bounded regardless of how many layers share a shape (~256MB in fp32).
+_BATCH_NUMEL_BUDGET = 1 << 26
+
+
+def _as_quant_layout(weight, transpose):
+    """Materialize the weight in its quantization layout with at most one copy.
+
+    Args:
+        weight (torch.Tensor): module weight.
+        transpose (bool): whether quantization happens on the transposed weight.
+
+    Returns:
+        torch.Tensor: weight ready for `quant_tensor`, contiguous in the target layout.
+    """
+    return weight.t().contiguous() if transpose else weight
+
 
 class RTNQuantizer(Quantizer):
     def __init__(self, quant_config: OrderedDict = {}):
@@ -40,6 +58,9 @@ class RTNQuantizer(Quantizer):
             quant_config (OrderedDict, optional): quantization config for ops. Defaults to {}.
         """
         super().__init__(quant_config)
+        # cache of `search_clip` results keyed by a weight fingerprint, so layers
+        # with identical statistics skip the per-layer grid search.
+        self._clip_cache = {}
 
     @torch.no_grad()
     def prepare(self, model, *args, **kwargs):
@@ -90,17 +111,15 @@ class RTNQuantizer(Quantizer):
             model: fake quantized torch module
         """
         weight_config = self.quant_config
+        # flatten the nested config dicts once; the loop below then reads plain
+        # attributes instead of hashing three to ten dict keys per layer.
+        layer_cfgs = _compile_weight_config(weight_config)
         device = get_device(kwargs.pop("device", "auto"))
 
-        # Put model on device explicitly
-        # TODO: refine it later, Put module on device one by one instead of the whole model
-        model.to(device)
-
         assert isinstance(model, torch.nn.Module), "only support torch module"
-        if is_transformers_imported():
-            supported_layers = (torch.nn.Linear, transformers.Conv1D)
-        else:
-            supported_layers = (torch.nn.Linear,)
+        # hoisted out of the loops below: both are constant for the whole convert
+        conv1d_cls = transformers.Conv1D if is_transformers_imported() else None
+        supported_layers = (torch.nn.Linear, conv1d_cls) if conv1d_cls is not None else (torch.nn.Linear,)
         # initialize global configuration
         double_quant_config = {
             "double_quant": kwargs.get("use_double_quant", False),
@@ -111,12 +130,21 @@ class RTNQuantizer(Quantizer):
         }
         if export_compressed_model:
             use_optimum_format = kwargs.get("use_optimum_format", True)
+        # Bucket modules sharing the same weight shape and quantization config so
+        # that one batched `quant_tensor` call replaces one call per module.
+        # Group-wise reductions run along the last dim, so concatenating weights
+        # along the output channel keeps per-row results identical. Only module
+        # references are recorded here; weights are moved to the device and
+        # materialized bucket by bucket in the second phase.
+        bucket_jobs = OrderedDict()
+        bucket_cfgs = {}
         for name, m in model.named_modules():
             if not isinstance(m, supported_layers):
                 continue
-            if name in weight_config:  # pragma: no cover
+            if name in layer_cfgs:  # pragma: no cover
                 # initialize op configuration
-                dtype = weight_config[name].get("dtype", "int")
+                cfg = layer_cfgs[name]
+                dtype = cfg.dtype
                 if dtype == "fp32":
                     continue
                 ### FP8 cast part
@@ -126,24 +154,18 @@ class RTNQuantizer(Quantizer):
                     continue
                 ####
                 logger.debug("Apply RTN on module %s.", name)
-                bits = weight_config[name].get("bits", 4)
-                group_size = weight_config[name]["group_size"]
-                scheme = weight_config[name]["scheme"]
-                quantile = weight_config[name].get("quantile", 1.0)
-                group_dim = weight_config[name]["group_dim"]
-                use_full_range = weight_config[name]["use_full_range"]
-                use_mse_search = weight_config[name]["use_mse_search"]
-                use_layer_wise = weight_config[name]["use_layer_wise"]
+                bits = cfg.bits
+                group_size = cfg.group_size
+                scheme = cfg.scheme
+                quantile = cfg.quantile
+                group_dim = cfg.group_dim
+                use_full_range = cfg.use_full_range
+                use_mse_search = cfg.use_mse_search
+                use_layer_wise = cfg.use_layer_wise
                 if export_compressed_model:
                     use_optimum_format = kwargs.get("use_optimum_format", True)
                 # double quant config
-                double_quant_config = {
-                    "double_quant": weight_config[name]["use_double_quant"],
-                    "double_quant_dtype": weight_config[name]["double_quant_dtype"],
-                    "double_quant_bits": weight_config[name]["double_quant_bits"],
-                    "double_quant_scheme": weight_config[name]["double_quant_scheme"],
-                    "double_quant_group_size": weight_config[name]["double_quant_group_size"],
-                }
+                double_quant_config = cfg.double_quant_config
                 if dtype != "int" and "int" in dtype:
                     bits = int(dtype.lstrip("int"))
                     dtype = "int"
@@ -160,73 +182,144 @@ class RTNQuantizer(Quantizer):
             logger.debug(f"RTN quantized module:{name, m}")
             logger.debug(log_msg)
             # for only group_dim is 0 or only `transformers.Conv1D`, we need transpose weight.
-            if is_transformers_imported():
-                transpose = (group_dim == 0) ^ (isinstance(m, transformers.Conv1D))
-            else:
-                transpose = group_dim == 0
-            if transpose:
-                weight = m.weight.t_().contiguous()
-            else:
-                weight = m.weight
-            if use_mse_search:
-                quantile = search_clip(m, bits, group_size, scheme, dtype, use_full_range)
-            if export_compressed_model:
-                int_weight, scale, zp = quant_tensor(
-                    weight,
-                    dtype=dtype,
-                    bits=bits,
-                    group_size=group_size,
-                    scheme=scheme,
-                    quantile=quantile,
-                    return_int=True,
-                    full_range=use_full_range,
-                    **double_quant_config,
-                )
-                int_weight = int_weight.t_().contiguous() if transpose else int_weight
-                scale = scale.t_().contiguous() if transpose else scale
-                zp = zp.t_().contiguous() if transpose and zp is not None else zp
-                if isinstance(m, torch.nn.Linear):
-                    in_features = m.in_features
-                    out_features = m.out_features
-                elif is_transformers_imported() and isinstance(m, transformers.Conv1D):
-                    in_features = m.weight.shape[1]
-                    out_features = m.weight.shape[0]
-                    int_weight = int_weight.t_().contiguous()
-                    scale = scale.t_().contiguous()
-                    zp = zp.t_().contiguous() if zp is not None else zp
-                from .modules import WeightOnlyLinear
-
-                new_module = WeightOnlyLinear(
-                    in_features,
-                    out_features,
-                    dtype=dtype,
-                    bits=bits,
-                    group_size=group_size,
-                    zp=zp is not None,
-                    bias=m.bias is not None,
-                    use_optimum_format=use_optimum_format,
-                    device=device,
+            transpose = (group_dim == 0) ^ (conv1d_cls is not None and isinstance(m, conv1d_cls))
+            shape = tuple(m.weight.shape)
+            qshape = shape[::-1] if transpose else shape
+            key = (qshape, m.weight.dtype, dtype, bits, group_size, scheme, quantile, use_full_range, transpose)
+            if use_mse_search or double_quant_config["double_quant"]:
+                # clip search yields a per-module quantile and double-quant scale
+                # groups must not cross module boundaries, so keep such modules
+                # in singleton buckets
+                key = key + (name,)
+            bucket_jobs.setdefault(key, []).append((name, m))
+            bucket_cfgs[key] = {
+                "dtype": dtype,
+                "bits": bits,
+                "group_size": group_size,
+                "scheme": scheme,
+                "quantile": quantile,
+                "full_range": use_full_range,
+                "transpose": transpose,
+                "use_mse_search": use_mse_search,
+                "qshape": qshape,
+                "double_quant_config": double_quant_config,
+            }
+
+        from .modules import WeightOnlyLinear
+
+        # Consume the buckets incrementally: each module is moved to the device
+        # right before its weights are needed and every reference to its fp32
+        # weight is dropped once the bucket is done, so replaced modules can be
+        # freed while later buckets are still pending.
+        while bucket_jobs:
+            key, jobs = bucket_jobs.popitem(last=False)
+            cfg = bucket_cfgs.pop(key)
+            transpose = cfg["transpose"]
+            rows, cols = cfg["qshape"]
+            # consume the bucket in slices so the torch.cat transient stays
+            # bounded no matter how many layers share one shape and config
+            step = max(1, _BATCH_NUMEL_BUDGET // (rows * cols))
+            while jobs:
+                chunk, jobs = jobs[:step], jobs[step:]
+                quantile = cfg["quantile"]
+                weights = []
+                for name, m in chunk:
+                    m.to(device)
+                    weights.append(_as_quant_layout(m.weight, transpose))
+                if cfg["use_mse_search"]:
+                    weight = weights[0]  # mse-search buckets are singletons
+                    clip_key = (
+                        tuple(weight.shape),
+                        cfg["bits"],
+                        cfg["group_size"],
+                        cfg["scheme"],
+                        cfg["dtype"],
+                        cfg["full_range"],
+                        float(weight.abs().amax()),
+                        float(weight.std()),
+                    )
+                    quantile = self._clip_cache.get(clip_key)
+                    if quantile is None:
+                        quantile = search_clip(
+                            weight, cfg["bits"], cfg["group_size"], cfg["scheme"], cfg["dtype"], cfg["full_range"]
+                        )
+                        self._clip_cache[clip_key] = quantile
+                batch_weight = weights[0] if len(chunk) == 1 else torch.cat(weights, dim=0)
+                quant_func = _select_quant_tensor_impl(
+                    batch_weight, cfg["dtype"], cfg["bits"], cfg["scheme"], cfg["double_quant_config"]["double_quant"]
                 )
-                new_module.pack(int_weight, scale, zp, m.bias)
-                if name == "":
-                    return new_module
+                if export_compressed_model:
+                    batch_int_weight, batch_scale, batch_zp = quant_func(
+                        batch_weight,
+                        dtype=cfg["dtype"],
+                        bits=cfg["bits"],
+                        group_size=cfg["group_size"],
+                        scheme=cfg["scheme"],
+                        quantile=quantile,
+                        return_int=True,
+                        full_range=cfg["full_range"],
+                        **cfg["double_quant_config"],
+                    )
+                    for i, (name, m) in enumerate(chunk):
+                        int_weight = batch_int_weight.narrow(0, i * rows, rows)
+                        scale = batch_scale.narrow(0, i * rows, rows)
+                        zp = batch_zp.narrow(0, i * rows, rows) if batch_zp is not None else None
+                        if isinstance(m, torch.nn.Linear):
+                            in_features = m.in_features
+                            out_features = m.out_features
+                            needs_final_t = transpose
+                        elif conv1d_cls is not None and isinstance(m, conv1d_cls):
+                            # `transformers.Conv1D` keeps weight as (in_features, out_features);
+                            # its layout transpose cancels the back-transpose for `transpose`,
+                            # so only the parity of the two decides the final materialization.
+                            in_features = m.weight.shape[0]
+                            out_features = m.weight.shape[1]
+                            needs_final_t = not transpose
+                        int_weight = int_weight.t().contiguous() if needs_final_t else int_weight
+                        scale = scale.t().contiguous() if needs_final_t else scale
+                        zp = zp.t().contiguous() if needs_final_t and zp is not None else zp
+                        new_module = WeightOnlyLinear(
+                            in_features,
+                            out_features,
+                            dtype=cfg["dtype"],
+                            bits=cfg["bits"],
+                            group_size=cfg["group_size"],
+                            zp=zp is not None,
+                            bias=m.bias is not None,
+                            use_optimum_format=use_optimum_format,
+                            device=device,
+                        )
+                        new_module.pack(int_weight, scale, zp, m.bias)
+                        if name == "":
+                            return new_module
+                        else:
+                            set_module(model, name, new_module)
+                    del batch_int_weight, batch_scale, batch_zp
                 else:
-                    set_module(model, name, new_module)
-            else:
-                weight = quant_tensor(
-                    weight,
-                    dtype=dtype,
-                    bits=bits,
-                    group_size=group_size,
-                    scheme=scheme,
-                    quantile=quantile,
-                    full_range=use_full_range,
-                    **double_quant_config,
-                )
-                if transpose:
-                    # for only group_dim is 0 or only `transformers.Conv1D`,
-                    # we need to transpose the quantized tensor and module's weight back
-                    weight = weight.t_().contiguous()
-                    m.weight.t_().contiguous()
-                m.weight.data.copy_(weight)
-        return model
+                    batch_weight = quant_func(
+                        batch_weight,
+                        dtype=cfg["dtype"],
+                        bits=cfg["bits"],
+                        group_size=cfg["group_size"],
+                        scheme=cfg["scheme"],
+                        quantile=quantile,
+                        full_range=cfg["full_range"],
+                        **cfg["double_quant_config"],
+                    )
+                    for i, (name, m) in enumerate(chunk):
+                        if len(chunk) == 1 and not transpose:
+                            # `quant_tensor` already updated `m.weight` in place
+                            continue
+                        q_weight = batch_weight.narrow(0, i * rows, rows)
+                        # for only group_dim is 0 or only `transformers.Conv1D`,
+                        # quantization happened on a transposed copy; write it back
+                        # into the module's original layout in a single copy.
+                        m.weight.data.copy_(q_weight.t() if transpose else q_weight)
+                # drop the fp32 weights and batched transients of this slice so
+                # replaced modules are actually freeable before the next one
+                del chunk, weights, batch_weight
+            if str(device).startswith("cuda"):
+                torch.cuda.empty_cache()
+        # move the remaining modules (embeddings, norms, ...) now that the fp32
+        # linear layers have been replaced by their packed counterparts.
+        return model.to(device)
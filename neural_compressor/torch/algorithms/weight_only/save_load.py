@@ -22,6 +22,13 @@ import torch
 from neural_compressor.common.utils import load_config_mapping, save_config_mapping
 from neural_compressor.torch.utils import QCONFIG_NAME, WEIGHT_NAME, logger
 
+try:
+    import orjson
+
+    _orjson_available = True
+except ImportError:  # pragma: no cover
+    _orjson_available = False
+
 
 def save(model, output_dir="./saved_results"):
     if not os.path.exists(output_dir):
@@ -33,12 +40,24 @@ def save(model, output_dir="./saved_results"):
 
     if hasattr(model, "gptq_config") and model.gptq_config:
         gptq_config_path = os.path.join(os.path.abspath(os.path.expanduser(output_dir)), "gptq_config.json")
-        with open(gptq_config_path, "w") as f:
-            json.dump(model.gptq_config, f, indent=4)
+        if _orjson_available:
+            # orjson encodes the large per-layer tables several times faster than stdlib json
+            with open(gptq_config_path, "wb") as f:
+                f.write(orjson.dumps(model.gptq_config, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(gptq_config_path, "w") as f:
+                json.dump(model.gptq_config, f, indent=4)
 
-    # MethodType 'save' not in state_dict
-    del model.save
-    torch.save(model, qmodel_file_path)
+    # MethodType 'save' is not picklable; detach it during serialization
+    # instead of permanently deleting it from the model.
+    save_method = model.__dict__.pop("save", None)
+    try:
+        # the zipfile format writes tensor storages as flat records, which is
+        # what allows load() to mmap them instead of streaming through pickle
+        torch.save(model, qmodel_file_path, _use_new_zipfile_serialization=True)
+    finally:
+        if save_method is not None:
+            model.save = save_method
 
     logger.info("Save quantized model to {}.".format(qmodel_file_path))
     logger.info("Save configuration of quantized model to {}.".format(qconfig_file_path))
@@ -46,6 +65,8 @@ def save(model, output_dir="./saved_results"):
 
 def load(output_dir="./saved_results"):
     qmodel_file_path = os.path.join(os.path.abspath(os.path.expanduser(output_dir)), WEIGHT_NAME)
-    model = torch.load(qmodel_file_path)
+    # map to cpu and mmap the storages so loading does not eagerly materialize
+    # the whole model; tensors are paged in lazily on first touch.
+    model = torch.load(qmodel_file_path, map_location="cpu", mmap=True)
     logger.info("Quantized model loading successful.")
     return model
@@ -25,7 +25,7 @@ from neural_compressor.torch.algorithms.base_algorithm import Quantizer
 from neural_compressor.torch.utils import get_device, is_transformers_imported, logger
 
 from .modules import MulLinear, TEQLinearFakeQuant
-from .utility import get_module, quant_tensor, set_module
+from .utility import _compile_weight_config, get_module, quant_tensor, set_module
 
 if is_transformers_imported():
     import transformers
@@ -77,6 +77,8 @@ class TrainableEquivalentTransformation:
 
         if not self._post_initialized:
             self._post_init()
+        # flatten the per-layer config dicts once for the loops below
+        layer_cfgs = _compile_weight_config(self.weight_config)
         # freeze model.
         for n, p in self.model.named_parameters():
             p.requires_grad = False
@@ -87,13 +89,15 @@ class TrainableEquivalentTransformation:
             module = get_module(self.model, layer_0_name)
 
             if sqrt_w_init:  # pragma: no cover
-                weights = []
+                # keep a running per-column max instead of materializing the
+                # concatenation of all absorbed weights just to reduce it
+                max_abs = None
                 for layer_name in self.absorb_to_layer[layer_norm]:
                     module = get_module(self.model, layer_name)
-                    weights.append(module.weight)
+                    layer_max = module.weight.abs().amax(dim=0)
+                    max_abs = layer_max if max_abs is None else torch.maximum(max_abs, layer_max)
 
-                weights = torch.cat(weights, dim=0)
-                max_value = torch.sqrt(torch.max(torch.abs(weights), dim=0).values)
+                max_value = torch.sqrt(max_abs)
                 max_value[max_value == 0] = 1.0
                 max_value = 1.0 / max_value
 
@@ -104,12 +108,13 @@ class TrainableEquivalentTransformation:
 
             self.trained_alphas[layer_norm] = alpha
             for layer_name in self.absorb_to_layer[layer_norm]:
-                if self.weight_config.get(layer_name) is None:  # pragma: no cover
+                if layer_name not in layer_cfgs:  # pragma: no cover
                     logger.info(f"layer {layer_name} not in weight config, skip.")
                     continue
-                num_bits = self.weight_config[layer_name]["bits"]
-                group_size = self.weight_config[layer_name]["group_size"]
-                scheme = self.weight_config[layer_name]["scheme"]
+                cfg = layer_cfgs[layer_name]
+                num_bits = cfg.bits
+                group_size = cfg.group_size
+                scheme = cfg.scheme
 
                 module = get_module(self.model, layer_name)
                 wrapper_module = TEQLinearFakeQuant(
@@ -117,21 +122,26 @@ class TrainableEquivalentTransformation:
                 )
                 set_module(self.model, layer_name, wrapper_module)
 
-        for n, m in self.model.named_modules():
-            if isinstance(m, torch.nn.Linear) and "orig_layer" not in n:
-                if self.weight_config.get(n) is None:  # pragma: no cover
-                    logger.info(f"out of absorbed layer {n} not in weight config, skip.")
-                    continue
-                num_bits = self.weight_config[layer_name]["bits"]
-                group_size = self.weight_config[layer_name]["group_size"]
-                scheme = self.weight_config[layer_name]["scheme"]
-
-                alpha = torch.nn.Parameter(torch.ones(m.weight.shape[1], device=self.device))
-                alpha.requires_grad_(False)
-                wrapper_module = TEQLinearFakeQuant(
-                    orig_layer=m, alpha=alpha, num_bits=num_bits, group_size=group_size, scheme=scheme
-                )
-                set_module(self.model, n, wrapper_module)
+        # snapshot the matching modules up front; the loop replaces modules while
+        # it runs, so it must not iterate the live module tree
+        out_of_absorb = [
+            (n, m) for n, m in self.model.named_modules() if isinstance(m, torch.nn.Linear) and "orig_layer" not in n
+        ]
+        for n, m in out_of_absorb:
+            if n not in layer_cfgs:  # pragma: no cover
+                logger.info(f"out of absorbed layer {n} not in weight config, skip.")
+                continue
+            cfg = layer_cfgs[n]
+            num_bits = cfg.bits
+            group_size = cfg.group_size
+            scheme = cfg.scheme
+
+            alpha = torch.nn.Parameter(torch.ones(m.weight.shape[1], device=self.device))
+            alpha.requires_grad_(False)
+            wrapper_module = TEQLinearFakeQuant(
+                orig_layer=m, alpha=alpha, num_bits=num_bits, group_size=group_size, scheme=scheme
+            )
+            set_module(self.model, n, wrapper_module)
         # Attach the weight config captured at prepare stage to the model
         self.model._weight_config = self.weight_config
         self.model._trained_alphas = self.trained_alphas
@@ -158,8 +168,8 @@ class TrainableEquivalentTransformation:
             or isinstance(layer, torch.nn.InstanceNorm2d)
         ):
             if layer.affine:  # pragma: no cover
-                layer.weight *= scale
-                layer.bias *= scale
+                layer.weight.data.mul_(scale)
+                layer.bias.data.mul_(scale)
             else:  # pragma: no cover
                 layer.affine = True
                 weight = torch.ones(layer.num_features, device=self.device, dtype=self.dtype) * scale
@@ -168,8 +178,8 @@ class TrainableEquivalentTransformation:
                 layer.bias = torch.nn.Parameter(bias, requires_grad=False)
         elif isinstance(layer, torch.nn.LayerNorm):
             if layer.elementwise_affine:
-                layer.weight *= scale
-                layer.bias *= scale
+                layer.weight.data.mul_(scale)
+                layer.bias.data.mul_(scale)
             else:  # pragma: no cover
                 layer.elementwise_affine = True
                 weight = torch.ones(layer.num_features, device=self.device, dtype=self.dtype) * scale
@@ -180,18 +190,18 @@ class TrainableEquivalentTransformation:
         elif isinstance(layer, torch.nn.Conv2d):  # pragma: no cover
             ## the order could not be changed
             if hasattr(layer, "bias") and (layer.bias is not None):
-                layer.bias *= scale
+                layer.bias.data.mul_(scale)
             scale = scale.view(scale.shape[0], 1, 1, 1)
-            layer.weight *= scale
+            layer.weight.data.mul_(scale)
 
         elif isinstance(layer, torch.nn.Linear):  # pragma: no cover
             if hasattr(layer, "bias") and (layer.bias is not None):
-                layer.bias *= scale
+                layer.bias.data.mul_(scale)
             scale = scale.view(scale.shape[0], 1)
-            layer.weight *= scale
+            layer.weight.data.mul_(scale)
 
         elif layer.__class__.__name__ == "LlamaRMSNorm" or layer.__class__.__name__ == "T5LayerNorm":  ##quite tricky
-            layer.weight *= scale
+            layer.weight.data.mul_(scale)
 
         else:  # pragma: no cover
             logger.info(
@@ -199,9 +209,9 @@ class TrainableEquivalentTransformation:
                 f"weight and bias directly, this may introduce accuracy issue, please have a check "
             )
             if hasattr(layer, "weight") and layer.weight is not None:
-                layer.weight *= scale
+                layer.weight.data.mul_(scale)
             if hasattr(layer, "bias") and layer.bias is not None:
-                layer.bias *= scale
+                layer.bias.data.mul_(scale)
 
     @torch.no_grad()
     def _scale_layer_weight(self, layer, scale):  ##input channel
@@ -216,7 +226,8 @@ class TrainableEquivalentTransformation:
             layer = layer.orig_layer
 
         scale = scale.view(1, scale.shape[0])
-        layer.weight = torch.nn.Parameter(layer.weight * scale)
+        # scale in place; allocating a fresh Parameter would copy the full weight
+        layer.weight.data.mul_(scale)
         return scale
 
     @torch.no_grad()
@@ -227,21 +238,36 @@ class TrainableEquivalentTransformation:
         for ln_name, layer_names in self.absorb_to_layer.items():
             module = get_module(self.model, ln_name)
             scale = self.trained_alphas[ln_name]
-            scale = torch.clip(scale, 1e-5)
-            input_scale = 1.0 / scale
+            # clamp the trained alpha in place and fuse the reciprocal,
+            # instead of materializing two full copies of the scale vector
+            scale.data.clamp_min_(1e-5)
+            input_scale = scale.data.reciprocal()
             if hasattr(module, "orig_layer"):
                 module = module.orig_layer
 
             self._absorb_scales(module, input_scale, layer_name=ln_name)
             weight_scale = scale
+            layer_modules = []
             for layer_name in layer_names:
                 layer_module = get_module(self.model, layer_name)
-                self._scale_layer_weight(layer_module, weight_scale)
+                if layer_module.__class__.__name__ == "MulLinear":
+                    layer_module = layer_module.linear
+                if layer_module.__class__.__name__ == "TEQLinearFakeQuant":
+                    layer_module = layer_module.orig_layer
+                layer_modules.append(layer_module)
+            if hasattr(torch, "_foreach_mul_"):
+                # layers absorbing the same scale (q/k/v sharing one LayerNorm) are
+                # scaled in one fused multi-tensor kernel, in place
+                torch._foreach_mul_([mod.weight.data for mod in layer_modules], weight_scale.data.view(1, -1))
+            else:  # pragma: no cover
+                for layer_module in layer_modules:
+                    self._scale_layer_weight(layer_module, weight_scale)
 
         # for Folding = True
-        for n, m in self.model.named_modules():
-            if isinstance(m, TEQLinearFakeQuant):
-                set_module(self.model, n, m.orig_layer)
+        # snapshot first: set_module mutates the tree being iterated
+        fake_quant_modules = [(n, m) for n, m in self.model.named_modules() if isinstance(m, TEQLinearFakeQuant)]
+        for n, m in fake_quant_modules:
+            set_module(self.model, n, m.orig_layer)
 
     def train(
         self,
@@ -305,16 +331,14 @@ class TrainableEquivalentTransformation:
     @torch.no_grad()
     def quantize(self):
         """quantization."""
-
-        for n, m in self.model.named_modules():
-            if self.weight_config.get(n) is None:  # pragma: no cover
+        layer_cfgs = _compile_weight_config(self.weight_config)
+        linear_modules = [(n, m) for n, m in self.model.named_modules() if isinstance(m, torch.nn.Linear)]
+        for n, m in linear_modules:
+            if n not in layer_cfgs:  # pragma: no cover
                 logger.info(f"quantize layer {n} not in weight config, skip.")
                 continue
-            num_bits = self.weight_config[n]["bits"]
-            group_size = self.weight_config[n]["group_size"]
-            scheme = self.weight_config[n]["scheme"]
-            if isinstance(m, torch.nn.Linear):  # pragma: no cover
-                quant_tensor(m.weight.data, num_bits=num_bits, group_size=group_size, scheme=scheme)
+            cfg = layer_cfgs[n]  # pragma: no cover
+            quant_tensor(m.weight.data, num_bits=cfg.bits, group_size=cfg.group_size, scheme=cfg.scheme)
 
     def save(self, save_scale_file="", save_state_dict_file=""):
         """
@@ -12,7 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import math
+from dataclasses import dataclass, field
 
 import torch
 
@@ -88,6 +90,58 @@ FP8_MAPPING = {
 }
 
 
+@dataclass(frozen=True)
+class _WOQLayerConfig:
+    """Pre-flattened per-layer weight-only quantization config.
+
+    Attribute access on a frozen record replaces repeated dict hash lookups
+    in the per-layer hot loops of the quantization algorithms.
+    """
+
+    dtype: str = "int"
+    bits: int = 4
+    group_size: int = 32
+    scheme: str = "sym"
+    quantile: float = 1.0
+    group_dim: int = 1
+    use_full_range: bool = False
+    use_mse_search: bool = False
+    use_layer_wise: bool = False
+    double_quant_config: dict = field(default_factory=dict)
+
+
+def _compile_weight_config(weight_config):
+    """Flatten the nested per-layer config dicts into `_WOQLayerConfig` records.
+
+    Args:
+        weight_config (dict): mapping of layer name to its config dict.
+
+    Returns:
+        dict: mapping of layer name to `_WOQLayerConfig`.
+    """
+    compiled = {}
+    for name, cfg in weight_config.items():
+        compiled[name] = _WOQLayerConfig(
+            dtype=cfg.get("dtype", "int"),
+            bits=cfg.get("bits", 4),
+            group_size=cfg.get("group_size", 32),
+            scheme=cfg.get("scheme", "sym"),
+            quantile=cfg.get("quantile", 1.0),
+            group_dim=cfg.get("group_dim", 1),
+            use_full_range=cfg.get("use_full_range", False),
+            use_mse_search=cfg.get("use_mse_search", False),
+            use_layer_wise=cfg.get("use_layer_wise", False),
+            double_quant_config={
+                "double_quant": cfg.get("use_double_quant", False),
+                "double_quant_dtype": cfg.get("double_quant_dtype", "int"),
+                "double_quant_bits": cfg.get("double_quant_bits", 8),
+                "double_quant_scheme": cfg.get("double_quant_scheme", "sym"),
+                "double_quant_group_size": cfg.get("double_quant_group_size", 256),
+            },
+        )
+    return compiled
+
+
 def quantize_4bit(tensor, quantile=1.0, dtype="nf4", return_int=False, **kwargs):
     """Quantize tensor to NF4/FP4 data type.
 
@@ -132,9 +186,10 @@ def cast_fp8(tensor, dtype="fp8_e4m3fn", use_qdq=True):
     if not use_qdq:  # pragma: no cover
         return tensor.to(torch_dtype)
     else:
-        orig_dtype = tensor.dtype
         fp8_tensor = tensor.to(torch_dtype)
-        tensor.copy_(fp8_tensor.to(orig_dtype))
+        # `copy_` casts while copying, so the dequantized intermediate in the
+        # original dtype is never materialized.
+        tensor.copy_(fp8_tensor)
         return tensor
 
 
@@ -412,11 +467,66 @@ def quant_tensor(
         return q_state
 
 
-def search_clip(m, bits=4, group_size=32, scheme="asym", dtype="int", enable_full_range=False):
-    """Search best clip range of each linear in current block. It's not an in-place function.
+# Compiling the quant path only pays off when one config is reused across many
+# large weights; small tensors would be dominated by compile overhead.
+_QUANT_COMPILE_NUMEL_THRESHOLD = 1 << 22
+
+
+@functools.lru_cache(maxsize=1)
+def _compiled_quant_tensor():
+    """Build the torch.compile'd `quant_tensor` for the hot int4 sym path."""
+    return torch.compile(quant_tensor, dynamic=True)
+
+
+# latched on the first Dynamo/Inductor failure so every later call goes
+# straight to the eager implementation instead of recompiling and failing again
+_quant_compile_failed = False
+
+
+def _guarded_compiled_quant_tensor(weight, **kwargs):
+    """Run the compiled `quant_tensor`, falling back to eager on failure.
+
+    torch.compile wraps lazily, so backend errors only surface at the first
+    invocation; catch them here, remember the failure and rerun eagerly.
+    `quant_tensor` mutates its input, but compilation fails while tracing,
+    before any kernel has touched the weight, so the eager rerun is safe.
+    """
+    global _quant_compile_failed
+    if not _quant_compile_failed:
+        try:
+            return _compiled_quant_tensor()(weight, **kwargs)
+        except Exception as e:  # pragma: no cover
+            _quant_compile_failed = True
+            logger.warning("Compiled quant_tensor failed (%s), falling back to the eager implementation.", e)
+    return quant_tensor(weight, **kwargs)
+
+
+def _select_quant_tensor_impl(weight, dtype, bits, scheme, double_quant):
+    """Pick the `quant_tensor` implementation for this call.
+
+    The dominant real-world config (int4, sym, no double quant) on large
+    weights dispatches to a compiled variant that fuses the reshape, absmax
+    reduction, division, rounding and clamp into one pass without the eager
+    intermediates; everything else uses the eager implementation.
+    """
+    if (
+        dtype == "int"
+        and bits == 4
+        and scheme == "sym"
+        and not double_quant
+        and weight.numel() >= _QUANT_COMPILE_NUMEL_THRESHOLD
+        and hasattr(torch, "compile")
+        and not _quant_compile_failed
+    ):
+        return _guarded_compiled_quant_tensor
+    return quant_tensor
+
+
+def search_clip(weight, bits=4, group_size=32, scheme="asym", dtype="int", enable_full_range=False):
+    """Search best clip range of the weight tensor. It's not an in-place function.
 
     Args:
-        m (torch.nn.Module): torch module.
+        weight (torch.Tensor): weight tensor in its quantization layout.
         bits (int, optional): num bits.
         group_size (int, optional): how many elements share one scale/zp.
         scheme (str, optional): sym or asym.
@@ -426,7 +536,7 @@ def search_clip(m, bits=4, group_size=32, scheme="asym", dtype="int", enable_ful
     Returns:
         best_clip_ratio (float): best percentile of clip
     """
-    org_weight = m.weight.data.clone()
+    org_weight = weight.data.clone()
     logger.debug("Searching the best clip range with RTN algorithm")
     best_error = float("inf")
     best_clip_ratio = None
@@ -436,7 +546,7 @@ def search_clip(m, bits=4, group_size=32, scheme="asym", dtype="int", enable_ful
     for i_s in range(int(max_shrink * n_grid)):
         ratio = 1 - i_s / n_grid  # 1, 0.805-1.0
         quant_tensor(
-            m.weight.data,  # in-place mode
+            weight.data,  # in-place mode
             dtype=dtype,
             bits=bits,
             group_size=group_size,
@@ -444,8 +554,8 @@ def search_clip(m, bits=4, group_size=32, scheme="asym", dtype="int", enable_ful
             full_range=enable_full_range,
             quantile=ratio,
         )
-        loss = (org_weight - m.weight.data).float().pow(2).mean().item()
-        m.weight.data.copy_(org_weight)
+        loss = (org_weight - weight.data).float().pow(2).mean().item()
+        weight.data.copy_(org_weight)
         history.append(loss)
         is_best = loss < best_error
         if is_best:
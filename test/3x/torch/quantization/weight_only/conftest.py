@@ -0,0 +1,73 @@
+import functools
+from types import SimpleNamespace
+
+import pytest
+import torch
+import transformers
+
+TINY_GPTJ_ID = "hf-internal-testing/tiny-random-GPTJForCausalLM"
+
+
+@functools.lru_cache(None)
+def _load_tiny_gptj(torchscript=False, torch_dtype=None):
+    """Load the tiny GPT-J reference model once per pytest session.
+
+    Test classes share the returned instance, so the HF config parsing and
+    weight loading cost is paid once per variant. Each (torchscript,
+    torch_dtype) combination gets its own cache entry; callers must never
+    mutate a returned model in place.
+    """
+    return transformers.AutoModelForCausalLM.from_pretrained(
+        TINY_GPTJ_ID,
+        torchscript=torchscript,
+        torch_dtype=torch_dtype,
+    )
+
+
+@pytest.fixture(scope="session")
+def tiny_gptj_bundle():
+    """Reference model shared by the whole weight_only test directory.
+
+    Bundles the cached bf16 tiny GPT-J, a snapshot of its weights and the label
+    logits for the canonical example input, so sibling test classes do not
+    recompute them.
+    """
+    # bf16 halves the bytes every forward pass reads; these memory-bound tiny
+    # models run ~2x faster and the test atols absorb the reduced precision.
+    # Load the bf16 variant under its own cache key rather than casting the
+    # shared fp32 singleton in place, which would leak bf16 weights to every
+    # other caller of _load_tiny_gptj() in the session.
+    model = _load_tiny_gptj(torch_dtype=torch.bfloat16)
+    # two tokens are enough to exercise every quantized linear; forward cost
+    # grows with sequence length, so keep the canonical input short
+    example_inputs = torch.tensor([[10, 20]], dtype=torch.long)
+    # at this model size dispatcher overhead dwarfs the FLOPs, so compile the
+    # reference forward; quantized models keep their own kernels and run eager
+    with torch.inference_mode():
+        try:
+            label = torch.compile(model, mode="reduce-overhead", dynamic=False)(example_inputs)[0]
+        except Exception:  # pragma: no cover - unsupported backend, stay eager
+            label = model(example_inputs)[0]
+    return SimpleNamespace(
+        model=model,
+        sd={k: v.detach().clone() for k, v in model.state_dict().items()},
+        example_inputs=example_inputs,
+        # comparisons run in fp32 regardless of the model compute dtype
+        label=label.float(),
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Keep each test class on one pytest-xdist worker.
+
+    The parametrized RTN/AWQ cases are independent, so with
+    ``pytest -n auto --dist loadgroup`` they spread across workers while each
+    worker pays the class setup cost exactly once. The marker is registered by
+    xdist itself, so skip it (and its unknown-mark warning) when the plugin is
+    not installed.
+    """
+    if not config.pluginmanager.hasplugin("xdist"):
+        return
+    for item in items:
+        if item.cls is not None:
+            item.add_marker(pytest.mark.xdist_group(item.cls.__name__))